@@ -1,26 +1,39 @@
 import copy
+import functools
+import operator
 import os
 import warnings
+from collections import defaultdict, deque
+from json.decoder import JSONDecodeError
 
 import gevent
+import rlp
 import structlog
+from cachetools import LRUCache, TTLCache, cachedmethod
 from eth_utils import (
     decode_hex,
     encode_hex,
+    keccak,
     remove_0x_prefix,
     to_canonical_address,
     to_checksum_address,
 )
+from gevent.event import Event
 from gevent.lock import Semaphore
+from gevent.pool import Pool
+from hexbytes import HexBytes
 from requests import ConnectTimeout
-from web3 import Web3
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from web3 import HTTPProvider, Web3
 from web3.gas_strategies.rpc import rpc_gas_price_strategy
-from web3.middleware import geth_poa_middleware
+from web3.middleware import combine_middlewares, geth_poa_middleware
 
 from raiden import constants
 from raiden.exceptions import AddressWithoutCode, EthNodeCommunicationError, EthNodeInterfaceError
 from raiden.network.rpc.middleware import block_hash_cache_middleware, connection_test_middleware
+from raiden.network.rpc.provider import RPC_POOL_MAXSIZE
 from raiden.network.rpc.smartcontract_proxy import ContractProxy
+from raiden.settings import GAS_LIMIT_CACHE_TTL, GAS_PRICE_CACHE_TTL
 from raiden.utils import is_supported_client, pex, privatekey_to_address, typing
 from raiden.utils.filters import StatelessFilter
 from raiden.utils.solc import (
@@ -31,6 +44,18 @@ from raiden.utils.solc import (
 
 log = structlog.get_logger(__name__)  # pylint: disable=invalid-name
 
+# Bounds of the exponential backoff used while polling for a new block
+POLL_INTERVAL_MIN = 0.2
+POLL_INTERVAL_MAX = 2.0
+
+
+@functools.lru_cache(maxsize=4096)
+def checksum_address(address: typing.Address) -> typing.AddressHex:
+    """ Cached `to_checksum_address`, the same few addresses are used by most
+    of the requests and the checksum requires a keccak.
+    """
+    return to_checksum_address(address)
+
 
 def geth_assert_rpc_interfaces(web3: Web3):
 
@@ -153,7 +178,7 @@ def check_address_has_code(
         contract_name: str = '',
 ):
     """ Checks that the given address contains code. """
-    result = client.web3.eth.getCode(to_checksum_address(address), 'latest')
+    result = client.get_code(address)
 
     if not result:
         if contract_name:
@@ -167,24 +192,53 @@ def check_address_has_code(
         ))
 
 
-def deploy_dependencies_symbols(all_contract):
-    dependencies = {}
+def check_addresses_have_code(
+        client: 'JSONRPCClient',
+        addresses: typing.List[typing.Address],
+        contract_name: str = '',
+):
+    """ Checks that all the given addresses contain code.
+
+    The `getCode` requests are sent concurrently, so checking many addresses
+    costs about one round trip.
+    """
+    checks = [
+        client.rpc_pool.spawn(check_address_has_code, client, address, contract_name)
+        for address in addresses
+    ]
+    gevent.joinall(checks, raise_error=True)
+
+
+def contract_address_from_nonce(
+        sender: typing.Address,
+        nonce: typing.Nonce,
+) -> typing.Address:
+    """ Return the address of the contract created by `sender` in the
+    transaction with the given `nonce`.
+    """
+    return typing.Address(keccak(rlp.encode([sender, nonce]))[12:])
+
 
+def deploy_dependencies_symbols(all_contract):
     symbols_to_contract = dict()
-    for contract_name in all_contract:
+    contract_to_unresolved = dict()
+
+    for contract_name, contract in all_contract.items():
         symbol = solidity_library_symbol(contract_name)
 
         if symbol in symbols_to_contract:
             raise ValueError('Conflicting library names.')
 
         symbols_to_contract[symbol] = contract_name
+        contract_to_unresolved[contract_name] = solidity_unresolved_symbols(contract['bin'])
 
-    for contract_name, contract in all_contract.items():
-        unresolved_symbols = solidity_unresolved_symbols(contract['bin'])
-        dependencies[contract_name] = [
+    dependencies = {
+        contract_name: [
             symbols_to_contract[unresolved]
             for unresolved in unresolved_symbols
         ]
+        for contract_name, unresolved_symbols in contract_to_unresolved.items()
+    }
 
     return dependencies
 
@@ -193,8 +247,8 @@ def dependencies_order_of_build(target_contract, dependencies_map):
     """ Return an ordered list of contracts that is sufficient to successfully
     deploy the target contract.
 
-    Note:
-        This function assumes that the `dependencies_map` is an acyclic graph.
+    Raises:
+        ValueError: If the dependencies of the target contract have a cycle.
     """
     if not dependencies_map:
         return [target_contract]
@@ -202,23 +256,47 @@ def dependencies_order_of_build(target_contract, dependencies_map):
     if target_contract not in dependencies_map:
         raise ValueError('no dependencies defined for {}'.format(target_contract))
 
-    order = [target_contract]
-    todo = list(dependencies_map[target_contract])
-
+    # only the contracts reachable from the target are required
+    required = {target_contract: None}
+    todo = [target_contract]
     while todo:
-        target_contract = todo.pop(0)
-        target_pos = len(order)
-
-        for dependency in dependencies_map[target_contract]:
-            # we need to add the current contract before all its depedencies
-            if dependency in order:
-                target_pos = order.index(dependency)
-            else:
+        contract = todo.pop()
+        for dependency in dependencies_map[contract]:
+            if dependency not in required:
+                required[dependency] = None
                 todo.append(dependency)
 
-        order.insert(target_pos, target_contract)
+    # topological sort, a contract is ready once all its dependencies are in
+    # the order
+    missing_dependencies = dict()
+    dependents = defaultdict(list)
+    for contract in required:
+        contract_dependencies = set(dependencies_map[contract])
+        missing_dependencies[contract] = len(contract_dependencies)
+
+        for dependency in contract_dependencies:
+            dependents[dependency].append(contract)
+
+    ready = deque(
+        contract
+        for contract, missing in missing_dependencies.items()
+        if missing == 0
+    )
+
+    order = list()
+    while ready:
+        contract = ready.popleft()
+        order.append(contract)
+
+        for dependent in dependents[contract]:
+            missing_dependencies[dependent] -= 1
+            if missing_dependencies[dependent] == 0:
+                ready.append(dependent)
+
+    # the contracts in a cycle never become ready
+    if len(order) != len(required):
+        raise ValueError('cyclic library dependencies')
 
-    order.reverse()
     return order
 
 
@@ -313,13 +391,49 @@ class JSONRPCClient:
 
         self.eth_node = eth_node
         self.privkey = privkey
+        # creating the account derives the public key, do it only once
+        self._account = web3.eth.account.privateKeyToAccount(privkey)
         self.address = address
+        self.checksum_address = address_checksumed
         self.web3 = web3
         self.default_block_num_confirmations = block_num_confirmations
 
         self._available_nonce = available_nonce
         self._nonce_lock = Semaphore()
 
+        # Receipts of transactions with enough confirmations don't change,
+        # these are cached to avoid repeated queries after a `poll`
+        self._receipt_cache = LRUCache(maxsize=1024)
+        self._gas_limit_cache = TTLCache(maxsize=8, ttl=GAS_LIMIT_CACHE_TTL)
+        self._gas_price_cache = TTLCache(maxsize=1, ttl=GAS_PRICE_CACHE_TTL)
+
+        # The code at an address can not change after the contract is
+        # deployed, only addresses with code are cached because an empty
+        # result may be for a contract which is not deployed yet
+        self._code_cache: typing.Dict[typing.AddressHex, bytes] = dict()
+
+        # Concurrent requests are bounded by the size of the HTTP connection
+        # pool, more greenlets would only wait for a free connection
+        self.rpc_pool = Pool(RPC_POOL_MAXSIZE)
+
+        # Raw transactions skip the web3 middleware stack, but not the
+        # middlewares of the provider itself, which retry failed requests
+        provider = web3.providers[0]
+        self._provider_request = None
+        if isinstance(provider, HTTPProvider):
+            self._provider_request = combine_middlewares(
+                tuple(provider.middlewares),
+                web3,
+                provider.make_request,
+            )
+
+        self._block_watcher: gevent.Greenlet = None
+        self._block_waiters = 0
+        self._new_block = Event()
+        # Kept across watchers, a restarted watcher must not report a block
+        # which was already seen as a new one
+        self._last_block_number: typing.Optional[typing.BlockNumber] = None
+
         log.debug(
             'JSONRPCClient created',
             node=pex(self.address),
@@ -336,8 +450,14 @@ class JSONRPCClient:
 
     def balance(self, account: typing.Address):
         """ Return the balance of the account of given address. """
-        return self.web3.eth.getBalance(to_checksum_address(account), 'pending')
+        return self.web3.eth.getBalance(checksum_address(account), 'pending')
 
+    @cachedmethod(operator.attrgetter('_gas_limit_cache'))
+    def gas_limit(self, block_identifier: typing.BlockSpecification = 'latest') -> int:
+        """ Return the gas limit of the block `block_identifier`. """
+        return self.web3.eth.getBlock(block_identifier)['gasLimit']
+
+    @cachedmethod(operator.attrgetter('_gas_price_cache'))
     def gas_price(self) -> int:
         # generateGasPrice takes the transaction to be send as an optional argument
         # but both strategies that we are using (time-based and rpc-based) don't make
@@ -345,6 +465,19 @@ class JSONRPCClient:
         # This needs to be reevaluated if we use different gas price strategies
         return int(self.web3.eth.generateGasPrice())
 
+    def get_code(self, address: typing.Address) -> bytes:
+        """ Return the code at `address`. """
+        address_checksumed = checksum_address(address)
+
+        code = self._code_cache.get(address_checksumed)
+        if code is None:
+            code = self.web3.eth.getCode(address_checksumed, 'latest')
+
+            if code:
+                self._code_cache[address_checksumed] = code
+
+        return code
+
     def new_contract_proxy(self, contract_interface, contract_address: typing.Address):
         """ Return a proxy for interacting with a smart contract.
 
@@ -360,11 +493,26 @@ class JSONRPCClient:
     def new_contract(self, contract_interface: typing.Dict, contract_address: typing.Address):
         return self.web3.eth.contract(
             abi=contract_interface,
-            address=to_checksum_address(contract_address),
+            address=checksum_address(contract_address),
         )
 
     def get_transaction_receipt(self, tx_hash: bytes):
-        return self.web3.eth.getTransactionReceipt(encode_hex(tx_hash))
+        receipt = self._receipt_cache.get(tx_hash)
+        if receipt is not None:
+            return receipt
+
+        receipt = self.web3.eth.getTransactionReceipt(encode_hex(tx_hash))
+
+        if receipt is not None and receipt['blockNumber'] is not None:
+            confirmation_block = receipt['blockNumber'] + self.default_block_num_confirmations
+            is_confirmed = (
+                not self.default_block_num_confirmations or
+                self.block_number() >= confirmation_block
+            )
+            if is_confirmed:
+                self._receipt_cache[tx_hash] = receipt
+
+        return receipt
 
     def deploy_solidity_contract(
             self,  # pylint: disable=too-many-locals
@@ -432,6 +580,12 @@ class JSONRPCClient:
                 node=pex(self.address),
             )
 
+            gas_limit = self.gas_limit() * 8 // 10
+            deployments = list()
+
+            # The address of a new contract depends only on the sender and the
+            # nonce, so all the libraries can be sent without waiting for the
+            # previous ones to be mined.
             for deploy_contract in deployment_order:
                 dependency_contract = all_contracts[deploy_contract]
 
@@ -440,26 +594,34 @@ class JSONRPCClient:
 
                 dependency_contract['bin'] = bytecode
 
-                gas_limit = self.web3.eth.getBlock('latest')['gasLimit'] * 8 // 10
-                transaction_hash = self.send_transaction(
+                transaction_hash, nonce = self._send_transaction(
                     to=typing.Address(b''),
                     startgas=gas_limit,
                     data=bytecode,
                 )
 
-                self.poll(transaction_hash)
-                receipt = self.get_transaction_receipt(transaction_hash)
-
-                contract_address = receipt['contractAddress']
-                # remove the hexadecimal prefix 0x from the address
-                contract_address = remove_0x_prefix(contract_address)
-
-                libraries[deploy_contract] = contract_address
-
-                deployed_code = self.web3.eth.getCode(to_checksum_address(contract_address))
-
-                if not deployed_code:
-                    raise RuntimeError('Contract address has no code, check gas usage.')
+                contract_address = contract_address_from_nonce(self.address, nonce)
+                libraries[deploy_contract] = remove_0x_prefix(encode_hex(contract_address))
+
+                # The waits are not pooled, they spend most of the time
+                # waiting for a block and would starve the other requests,
+                # `poll` only takes a slot for the receipt queries
+                deployments.append(gevent.spawn(
+                    self._wait_for_deployment,
+                    deploy_contract,
+                    transaction_hash,
+                    contract_address,
+                ))
+
+            gevent.joinall(deployments, raise_error=True)
+
+            try:
+                check_addresses_have_code(
+                    self,
+                    [deployment.get() for deployment in deployments],
+                )
+            except AddressWithoutCode as e:
+                raise RuntimeError('Contract address has no code, check gas usage.') from e
 
             hex_bytecode = solidity_resolve_symbols(contract['bin'], libraries)
             bytecode = decode_hex(hex_bytecode)
@@ -480,11 +642,10 @@ class JSONRPCClient:
             startgas=contract_transaction['gas'],
         )
 
-        self.poll(transaction_hash)
-        receipt = self.get_transaction_receipt(transaction_hash)
+        receipt = self.poll(transaction_hash)
         contract_address = receipt['contractAddress']
 
-        deployed_code = self.web3.eth.getCode(to_checksum_address(contract_address))
+        deployed_code = self.get_code(contract_address)
 
         if not deployed_code:
             raise RuntimeError(
@@ -498,6 +659,29 @@ class JSONRPCClient:
             contract_address,
         )
 
+    def _wait_for_deployment(
+            self,
+            contract_name: str,
+            transaction_hash: bytes,
+            expected_address: typing.Address,
+    ) -> typing.Address:
+        """ Wait for the contract creation `transaction_hash` and check the
+        contract was created at `expected_address`.
+        """
+        receipt = self.poll(transaction_hash)
+        contract_address = to_canonical_address(receipt['contractAddress'])
+
+        if contract_address != expected_address:
+            raise RuntimeError(
+                'Contract {} was deployed at {}, expected {}.'.format(
+                    contract_name,
+                    to_checksum_address(contract_address),
+                    to_checksum_address(expected_address),
+                ),
+            )
+
+        return contract_address
+
     def send_transaction(
             self,
             to: typing.Address,
@@ -511,47 +695,80 @@ class JSONRPCClient:
         locally sign the transaction. This requires an extended server
         implementation that accepts the variables v, r, and s.
         """
+        transaction_hash, _ = self._send_transaction(to, startgas, value, data)
+        return transaction_hash
+
+    def _send_transaction(
+            self,
+            to: typing.Address,
+            startgas: int,
+            value: int = 0,
+            data: bytes = b'',
+    ) -> typing.Tuple[bytes, typing.Nonce]:
+        """ Sign and send a transaction, returns its hash and the nonce used. """
         if to == to_canonical_address(constants.NULL_ADDRESS):
             warnings.warn('For contract creation the empty string must be used.')
 
-        with self._nonce_lock:
-            nonce = self._available_nonce
-            gas_price = self.gas_price()
+        # Only the nonce dependent work is done while holding the lock, the
+        # gas price may require a request to the node.
+        gas_price = self.gas_price()
 
-            transaction = {
-                'data': data,
-                'gas': startgas,
-                'nonce': nonce,
-                'value': value,
-                'gasPrice': gas_price,
-            }
-            node_gas_price = self.web3.eth.gasPrice
-            log.debug(
-                'Calculated gas price for transaction',
-                node=pex(self.address),
-                calculated_gas_price=gas_price,
-                node_gas_price=node_gas_price,
-            )
+        transaction = {
+            'data': data,
+            'gas': startgas,
+            'value': value,
+            'gasPrice': gas_price,
+        }
 
-            # add the to address if not deploying a contract
-            if to != b'':
-                transaction['to'] = to_checksum_address(to)
+        # add the to address if not deploying a contract
+        if to != b'':
+            transaction['to'] = checksum_address(to)
 
-            signed_txn = self.web3.eth.account.signTransaction(transaction, self.privkey)
+        # The transaction must be sent while holding the lock, otherwise a
+        # failed request would leave a gap in the nonces and every following
+        # transaction would be stuck.
+        with self._nonce_lock:
+            nonce = self._available_nonce
+            transaction['nonce'] = nonce
+
+            signed_txn = self._account.signTransaction(transaction)
 
             log_details = {
                 'node': pex(self.address),
-                'nonce': transaction['nonce'],
+                'nonce': nonce,
                 'gasLimit': transaction['gas'],
                 'gasPrice': transaction['gasPrice'],
             }
             log.debug('send_raw_transaction called', **log_details)
 
-            tx_hash = self.web3.eth.sendRawTransaction(signed_txn.rawTransaction)
+            tx_hash = self._send_raw_transaction(signed_txn.rawTransaction)
             self._available_nonce += 1
 
-            log.debug('send_raw_transaction returned', tx_hash=encode_hex(tx_hash), **log_details)
-            return tx_hash
+        log.debug('send_raw_transaction returned', tx_hash=tx_hash.hex(), **log_details)
+        return tx_hash, nonce
+
+    def _send_raw_transaction(self, raw_transaction: bytes) -> HexBytes:
+        """ Send an already signed transaction.
+
+        With an HTTP provider the request skips the web3 middleware stack and
+        only goes through the provider's middlewares, so connection errors are
+        still retried.
+        """
+        if self._provider_request is None:
+            return self.web3.eth.sendRawTransaction(raw_transaction)
+
+        try:
+            response = self._provider_request(
+                'eth_sendRawTransaction',
+                [encode_hex(raw_transaction)],
+            )
+        except (RequestsConnectionError, JSONDecodeError):
+            raise EthNodeCommunicationError('Web3 provider not connected')
+
+        if 'error' in response:
+            raise ValueError(response['error'])
+
+        return HexBytes(response['result'])
 
     def poll(
             self,
@@ -561,16 +778,24 @@ class JSONRPCClient:
 
         Args:
             transaction_hash: Transaction hash that we are waiting for.
+
+        Returns:
+            The receipt of the transaction.
         """
         if len(transaction_hash) != 32:
             raise ValueError(
                 'transaction_hash must be a 32 byte hash',
             )
 
-        transaction_hash = encode_hex(transaction_hash)
+        receipt = self._receipt_cache.get(transaction_hash)
+        if receipt is not None:
+            return receipt
 
-        # used to check if the transaction was removed, this could happen
-        # if gas price is too low:
+        transaction_hash_hex = encode_hex(transaction_hash)
+
+        # used to check if the transaction was removed after being mined, this
+        # could happen if the block is reorged and the transaction is dropped
+        # because the gas price is too low:
         #
         # > Transaction (acbca3d6) below gas price (tx=1 Wei ask=18
         # > Shannon). All sequential txs from this address(7d0eae79)
@@ -579,28 +804,83 @@ class JSONRPCClient:
         last_result = None
 
         while True:
-            # Could return None for a short period of time, until the
-            # transaction is added to the pool
-            transaction = self.web3.eth.getTransaction(transaction_hash)
+            # The receipt is None until the transaction is mined
+            receipt = self.rpc_pool.apply(
+                self.web3.eth.getTransactionReceipt,
+                (transaction_hash_hex,),
+            )
 
-            # if the transaction was added to the pool and then removed
-            if transaction is None and last_result is not None:
+            # if the transaction was mined and then removed
+            if receipt is None and last_result is not None:
                 raise Exception('invalid transaction, check gas price')
 
-            # the transaction was added to the pool and mined
-            if transaction and transaction['blockNumber'] is not None:
-                last_result = transaction
+            # this will wait for both APPLIED and REVERTED transactions
+            if receipt is not None and receipt['blockNumber'] is not None:
+                last_result = receipt
 
-                # this will wait for both APPLIED and REVERTED transactions
-                transaction_block = transaction['blockNumber']
+                transaction_block = receipt['blockNumber']
                 confirmation_block = transaction_block + self.default_block_num_confirmations
 
+                is_confirmed = (
+                    not self.default_block_num_confirmations or
+                    self.block_number() >= confirmation_block
+                )
+                if is_confirmed:
+                    self._receipt_cache[transaction_hash] = receipt
+                    return receipt
+
+            self._wait_for_new_block()
+
+    def _wait_for_new_block(self) -> None:
+        """ Wait until the shared block watcher sees a new block.
+
+        All the concurrent calls to `poll` share a single watcher, so the node
+        is asked for the block number once per interval instead of once per
+        polled transaction.
+        """
+        new_block = self._new_block
+
+        if self._block_watcher is None or self._block_watcher.dead:
+            self._block_watcher = gevent.spawn(self._watch_blocks)
+
+        self._block_waiters += 1
+        try:
+            new_block.wait()
+        finally:
+            self._block_waiters -= 1
+
+    def _watch_blocks(self) -> None:
+        poll_interval = POLL_INTERVAL_MIN
+
+        while True:
+            gevent.sleep(poll_interval)
+
+            if not self._block_waiters:
+                break
+
+            try:
                 block_number = self.block_number()
+            except Exception as e:  # pylint: disable=broad-except
+                # Don't leave the waiters hanging if the request failed, `poll`
+                # will do its own request and propagate the error.
+                log.warning(
+                    'Block watcher request failed',
+                    node=pex(self.address),
+                    error=str(e),
+                )
+                self._notify_new_block()
+                break
 
-                if block_number >= confirmation_block:
-                    return transaction
+            if block_number != self._last_block_number:
+                self._last_block_number = typing.BlockNumber(block_number)
+                poll_interval = POLL_INTERVAL_MIN
+                self._notify_new_block()
+            else:
+                poll_interval = min(poll_interval * 2, POLL_INTERVAL_MAX)
 
-            gevent.sleep(1.0)
+    def _notify_new_block(self) -> None:
+        new_block, self._new_block = self._new_block, Event()
+        new_block.set()
 
     def new_filter(
             self,
@@ -615,7 +895,7 @@ class JSONRPCClient:
             {
                 'fromBlock': from_block,
                 'toBlock': to_block,
-                'address': to_checksum_address(contract_address),
+                'address': checksum_address(contract_address),
                 'topics': topics,
             },
         )
@@ -631,6 +911,6 @@ class JSONRPCClient:
         return self.web3.eth.getLogs({
             'fromBlock': from_block,
             'toBlock': to_block,
-            'address': to_checksum_address(contract_address),
+            'address': checksum_address(contract_address),
             'topics': topics,
         })
@@ -2,25 +2,28 @@ import functools
 from json.decoder import JSONDecodeError
 
 from cachetools import LRUCache
+from requests.exceptions import ConnectionError as RequestsConnectionError
 from web3.middleware.cache import construct_simple_cache_middleware
 
 from raiden.exceptions import EthNodeCommunicationError
 
 
 def make_connection_test_middleware():
-    def connection_test_middleware(make_request, web3):
-        """ Creates middleware that checks if the provider is connected. """
+    def connection_test_middleware(make_request, web3):  # pylint: disable=unused-argument
+        """ Creates middleware that converts connection errors.
+
+        The connection is not probed before each request, that doubled the
+        number of requests sent to the node. The availability of the node is
+        checked once while the client is created.
+        """
 
         def middleware(method, params):
             try:
-                if web3.isConnected():
-                    return make_request(method, params)
-                else:
-                    raise EthNodeCommunicationError('Web3 provider not connected')
+                return make_request(method, params)
 
-            # the isConnected check doesn't currently catch JSON errors
+            # the node may also respond with invalid JSON when it's not ready
             # see https://github.com/ethereum/web3.py/issues/866
-            except JSONDecodeError:
+            except (RequestsConnectionError, JSONDecodeError):
                 raise EthNodeCommunicationError('Web3 provider not connected')
 
         return middleware
@@ -0,0 +1,64 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from web3 import HTTPProvider
+
+RPC_POOL_CONNECTIONS = 32
+RPC_POOL_MAXSIZE = 64
+RPC_REQUEST_TIMEOUT = 10
+
+
+def make_rpc_session(
+        pool_connections: int = RPC_POOL_CONNECTIONS,
+        pool_maxsize: int = RPC_POOL_MAXSIZE,
+) -> requests.Session:
+    """ Return a session with a connection pool large enough for concurrent
+    JSON-RPC requests.
+
+    Only connection errors are retried, a POST which reached the node is never
+    sent twice.
+    """
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(total=3, backoff_factor=0.2),
+    )
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """ HTTPProvider which sends every request through the same keep-alive
+    session.
+
+    web3's HTTPProvider uses a session with the default pool of 10
+    connections, which is exhausted by concurrent greenlets and forces new
+    TCP/TLS handshakes.
+    """
+
+    def __init__(self, endpoint_uri: str, request_kwargs=None, session=None):
+        super().__init__(endpoint_uri, request_kwargs)
+        self.session = session or make_rpc_session()
+
+    def make_request(self, method, params):
+        self.logger.debug('Making request HTTP. URI: %s, Method: %s', self.endpoint_uri, method)
+
+        request_kwargs = dict(self.get_request_kwargs())
+        request_kwargs.setdefault('timeout', RPC_REQUEST_TIMEOUT)
+
+        request_data = self.encode_rpc_request(method, params)
+        raw_response = self.session.post(self.endpoint_uri, data=request_data, **request_kwargs)
+        raw_response.raise_for_status()
+
+        response = self.decode_rpc_response(raw_response.content)
+        self.logger.debug(
+            'Getting response HTTP. URI: %s, Method: %s, Response: %s',
+            self.endpoint_uri,
+            method,
+            response,
+        )
+        return response
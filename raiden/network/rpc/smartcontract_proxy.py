@@ -26,14 +26,18 @@ class ClientErrorInspectResult(Enum):
 
 
 def inspect_client_error(val_err: ValueError, eth_node: EthClient) -> ClientErrorInspectResult:
-    # both clients return invalid json. They use single quotes while json needs double ones.
-    # Also parity may return something like: 'data': 'Internal("Error message")' which needs
-    # special processing
-    json_response = str(val_err).replace("'", '"').replace('("', '(').replace('")', ')')
-    try:
-        error = json.loads(json_response)
-    except json.JSONDecodeError:
-        return ClientErrorInspectResult.PROPAGATE_ERROR
+    # web3 raises the error object of the JSON-RPC response as the exception's argument
+    error = val_err.args[0] if val_err.args else None
+
+    if not isinstance(error, dict):
+        # both clients return invalid json. They use single quotes while json needs double ones.
+        # Also parity may return something like: 'data': 'Internal("Error message")' which needs
+        # special processing
+        json_response = str(val_err).replace("'", '"').replace('("', '(').replace('")', ')')
+        try:
+            error = json.loads(json_response)
+        except json.JSONDecodeError:
+            return ClientErrorInspectResult.PROPAGATE_ERROR
 
     if eth_node == EthClient.GETH:
         if error['code'] == -32000:
@@ -156,7 +160,7 @@ class ContractProxy:
         fn = getattr(self.contract.functions, function)
         try:
             return fn(*args).estimateGas({
-                'from': to_checksum_address(self.jsonrpc_client.address),
+                'from': self.jsonrpc_client.checksum_address,
             })
         except ValueError as err:
             action = inspect_client_error(err, self.jsonrpc_client.eth_node)
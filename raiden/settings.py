@@ -5,6 +5,10 @@ from raiden.constants import Environment
 INITIAL_PORT = 38647
 
 CACHE_TTL = 60
+# The block gas limit changes by at most 1/1024 per block, while the gas price
+# may change quickly
+GAS_LIMIT_CACHE_TTL = 60
+GAS_PRICE_CACHE_TTL = 15
 GAS_LIMIT = 10 * 10**6
 GAS_LIMIT_HEX = to_hex(GAS_LIMIT)
 GAS_PRICE = denoms.shannon * 20  # pylint: disable=no-member
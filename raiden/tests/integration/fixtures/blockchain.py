@@ -1,10 +1,11 @@
 import pytest
-from web3 import HTTPProvider, Web3
+from web3 import Web3
 
 from raiden.constants import Environment
 from raiden.network.blockchain_service import BlockChainService
 from raiden.network.discovery import ContractDiscovery
 from raiden.network.rpc.client import JSONRPCClient
+from raiden.network.rpc.provider import PooledHTTPProvider
 from raiden.tests.utils.geth import GethNodeDescription, geth_run_private_blockchain
 from raiden.tests.utils.network import jsonrpc_services
 from raiden.tests.utils.tests import cleanup_tasks
@@ -45,7 +46,7 @@ def web3(
         host = '0.0.0.0'
         rpc_port = blockchain_rpc_ports[0]
         endpoint = f'http://{host}:{rpc_port}'
-        web3 = Web3(HTTPProvider(endpoint))
+        web3 = Web3(PooledHTTPProvider(endpoint))
 
         assert len(blockchain_private_keys) == len(blockchain_rpc_ports)
         assert len(blockchain_private_keys) == len(blockchain_p2p_ports)
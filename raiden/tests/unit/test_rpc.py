@@ -1,4 +1,13 @@
+from collections import Counter
+
+import gevent
+import pytest
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from web3 import HTTPProvider, Web3
+
 from raiden.constants import EthClient
+from raiden.network.rpc import client as rpc_client
+from raiden.network.rpc.client import JSONRPCClient, dependencies_order_of_build
 from raiden.network.rpc.smartcontract_proxy import ClientErrorInspectResult, inspect_client_error
 
 
@@ -12,3 +21,155 @@ def test_inspect_client_error():
 
     result = inspect_client_error(exception, EthClient.PARITY)
     assert result == ClientErrorInspectResult.ALWAYS_FAIL
+
+
+def test_inspect_client_error_payload():
+    """The error object raised by web3 is inspected without parsing its string form"""
+    exception = ValueError({
+        'code': -32000,
+        'message': 'insufficient funds for gas * price + value',
+    })
+
+    result = inspect_client_error(exception, EthClient.GETH)
+    assert result == ClientErrorInspectResult.INSUFFICIENT_FUNDS
+
+
+def test_dependencies_order_of_build():
+    dependencies_map = {
+        'Target': ['LibA', 'LibB'],
+        'LibA': ['LibB', 'LibC'],
+        'LibB': ['LibC'],
+        'LibC': [],
+        'Unrelated': ['LibC'],
+    }
+
+    order = dependencies_order_of_build('Target', dependencies_map)
+    assert order == ['LibC', 'LibB', 'LibA', 'Target']
+
+    assert dependencies_order_of_build('LibB', dependencies_map) == ['LibC', 'LibB']
+    assert dependencies_order_of_build('Target', {}) == ['Target']
+
+    cyclic_map = {
+        'Target': ['LibA'],
+        'LibA': ['LibB'],
+        'LibB': ['LibA'],
+    }
+    with pytest.raises(ValueError):
+        dependencies_order_of_build('Target', cyclic_map)
+
+
+class FakeNodeProvider(HTTPProvider):
+    """ Answers the requests done by `JSONRPCClient` and `poll` after `delay`
+    seconds. The transaction is never mined, the block number only changes
+    when the test sets it.
+    """
+
+    def __init__(self, delay=0):
+        super().__init__('http://127.0.0.1:8545')
+        self.delay = delay
+        self.block_number = 10
+        self.error = None
+        self.connection_errors = 0
+        self.requests = Counter()
+
+    def make_request(self, method, params):
+        self.requests[method] += 1
+        gevent.sleep(self.delay)
+
+        if method == 'eth_blockNumber' and self.error is not None:
+            raise self.error
+
+        if method == 'eth_sendRawTransaction' and self.connection_errors:
+            self.connection_errors -= 1
+            raise RequestsConnectionError()
+
+        results = {
+            'web3_clientVersion': 'Geth/v1.8.0-stable/linux-amd64/go1.10',
+            'eth_getTransactionCount': hex(0),
+            'eth_getTransactionReceipt': None,
+            'eth_blockNumber': hex(self.block_number),
+            'eth_sendRawTransaction': '0x' + '11' * 32,
+        }
+        return {'jsonrpc': '2.0', 'id': 0, 'result': results[method]}
+
+
+@pytest.fixture
+def fake_node_client(monkeypatch):
+    """ A JSONRPCClient talking to a `FakeNodeProvider`, with the block
+    watcher intervals scaled down so the tests don't wait for real blocks.
+    """
+    monkeypatch.setattr(rpc_client, 'POLL_INTERVAL_MIN', 0.001)
+    monkeypatch.setattr(rpc_client, 'POLL_INTERVAL_MAX', 0.004)
+
+    provider = FakeNodeProvider()
+    with pytest.warns(UserWarning):
+        client = JSONRPCClient(Web3(provider), b'\x01' * 32, uses_infura=True)
+
+    return client, provider
+
+
+@pytest.mark.parametrize('delay', [0, 0.005])
+def test_poll_requests_once_per_block(fake_node_client, delay):
+    """ A poll must query its transaction again only when there is a new
+    block, also when the requests are slower than the block watcher interval.
+    """
+    client, provider = fake_node_client
+    provider.delay = delay
+
+    poll = gevent.spawn(client.poll, bytes(32))
+
+    # the first request, and the one after the first block the watcher sees
+    gevent.sleep(0.1)
+    assert provider.requests['eth_getTransactionReceipt'] == 2
+
+    provider.block_number += 1
+    gevent.sleep(0.1)
+    assert provider.requests['eth_getTransactionReceipt'] == 3
+
+    gevent.sleep(0.1)
+    assert provider.requests['eth_getTransactionReceipt'] == 3
+
+    poll.kill()
+
+
+def test_block_watcher_request_failure(fake_node_client):
+    """ A failed block number request must wake the waiters. """
+    client, provider = fake_node_client
+    provider.error = ValueError('node unavailable')
+
+    with gevent.Timeout(2):
+        client._wait_for_new_block()
+
+    client._block_watcher.join()
+    assert client._block_watcher.successful()
+
+
+def test_send_raw_transaction_retries_connection_errors(fake_node_client):
+    """ The raw transactions skip the web3 middlewares, but failed requests
+    must still be retried by the provider.
+    """
+    client, provider = fake_node_client
+    provider.connection_errors = 2
+
+    transaction_hash = client._send_raw_transaction(b'\x00')
+
+    assert transaction_hash == b'\x11' * 32
+    assert provider.requests['eth_sendRawTransaction'] == 3
+
+
+def test_poll_releases_the_rpc_pool_while_waiting(fake_node_client):
+    """ A poll only holds a slot of the RPC pool for its requests, not while
+    it waits for the next block.
+    """
+    client, provider = fake_node_client
+    provider.delay = 0.01
+
+    poll = gevent.spawn(client.poll, bytes(32))
+
+    gevent.sleep(0.005)
+    assert client.rpc_pool.free_count() == client.rpc_pool.size - 1
+
+    gevent.sleep(0.1)
+    assert client.rpc_pool.free_count() == client.rpc_pool.size
+
+    poll.kill()
@@ -1,4 +1,4 @@
-from raiden.utils import privtopub, sha3
+from raiden.utils import privtopub, sha3, sha3_secret
 
 
 def test_privtopub():
@@ -7,3 +7,10 @@ def test_privtopub():
               '705f70c7554b26e82b90d2d1bbbaf711b10c6c8b807077f4070200a8fb4c6b771')
 
     assert pubkey == privtopub(privkey).hex()
+
+
+def test_sha3_secret():
+    secret = b'secret'.rjust(32, b'\x00')
+
+    assert sha3_secret(secret) == sha3(secret)
+    assert sha3_secret(secret) is sha3_secret(secret)
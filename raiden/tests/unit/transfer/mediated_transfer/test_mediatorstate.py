@@ -170,6 +170,18 @@ def test_next_route_amount():
     assert chosen_channel.identifier == channels[0].identifier
 
 
+def test_filter_used_routes():
+    """ Channels used by a pair must be removed, keeping the routes order. """
+    setup = factories.make_transfers_pair(4)
+    first_pair = setup.transfers_pair[0]
+
+    routes = setup.channels.get_routes(3, 1, 2, 0)
+    filtered_routes = mediator.filter_used_routes([first_pair], routes)
+
+    assert filtered_routes == setup.channels.get_routes(3, 2)
+    assert mediator.filter_used_routes([], routes) == routes
+
+
 def test_next_route_reveal_timeout():
     """ Routes with a larger reveal timeout than timeout_blocks must be ignored. """
     timeout_blocks = 10
@@ -271,6 +283,28 @@ def test_set_payee():
     assert transfers_pair[1].payee_state == 'payee_pending'
 
 
+def test_get_pairs_by_payer():
+    setup = factories.make_transfers_pair(3)
+    first_pair, second_pair = setup.transfers_pair
+
+    mediator_state = MediatorTransferState(UNIT_SECRETHASH)
+    mediator_state.transfers_pair.append(first_pair)
+
+    first_payer = first_pair.payer_transfer.balance_proof.sender
+    second_payer = second_pair.payer_transfer.balance_proof.sender
+
+    assert mediator.get_pairs_by_payer(mediator_state, first_payer) == [first_pair]
+    assert mediator.get_pairs_by_payer(mediator_state, second_payer) == []
+
+    # pairs appended after the index was built must be found
+    mediator_state.transfers_pair.append(second_pair)
+    assert mediator.get_pairs_by_payer(mediator_state, second_payer) == [second_pair]
+
+    # replacing the list must reset the index
+    mediator_state.transfers_pair = [second_pair]
+    assert mediator.get_pairs_by_payer(mediator_state, first_payer) == []
+
+
 def test_events_for_expired_pairs():
     """ The transfer pair must switch to expired at the right block. """
     setup = factories.make_transfers_pair(2)
@@ -310,6 +344,42 @@ def test_events_for_expired_pairs():
     assert pair.payer_state == 'payer_expired'
 
 
+def test_handle_block_before_next_action_block():
+    """ Blocks before the first lock enters the danger zone must not be
+    processed.
+    """
+    setup = factories.make_transfers_pair(2)
+    pair = setup.transfers_pair[0]
+
+    mediator_state = MediatorTransferState(UNIT_SECRETHASH)
+    mediator_state.transfers_pair = setup.transfers_pair
+
+    payer_channel = mediator.get_payer_channel(setup.channel_map, pair)
+    first_unsafe_block = pair.payer_transfer.lock.expiration - payer_channel.reveal_timeout
+
+    next_action_block = mediator.get_next_action_block(mediator_state, setup.channel_map)
+    assert next_action_block == first_unsafe_block
+
+    # the cached value must be reset when the pairs change
+    mediator_state.transfers_pair = list()
+    assert mediator.get_next_action_block(mediator_state, setup.channel_map) is None
+
+    mediator_state.transfers_pair = setup.transfers_pair
+    block = Block(
+        block_number=first_unsafe_block - 1,
+        gas_limit=1,
+        block_hash=factories.make_transaction_hash(),
+    )
+    iteration = mediator.handle_block(
+        mediator_state,
+        block,
+        setup.channel_map,
+        random.Random(),
+    )
+    assert iteration.new_state == mediator_state
+    assert not iteration.events
+
+
 def test_events_for_refund():
     amount = 10
     expiration = 30
@@ -633,6 +703,67 @@ def test_events_for_balanceproof_lock_expired():
     assert not events
 
 
+def test_events_for_offchain_unlock():
+    """ The single pass must produce the same events as revealing the secret
+    and then sending the balance proofs, only the message identifiers differ
+    because they are drawn in a different order.
+    """
+    setup = factories.make_transfers_pair(3, amount=10, block_number=1)
+    for pair in setup.transfers_pair:
+        pair.payee_state = 'payee_secret_revealed'
+
+    last_pair = setup.transfers_pair[-1]
+    payer_channel = mediator.get_payer_channel(setup.channel_map, last_pair)
+    safe_block = last_pair.payee_transfer.lock.expiration - payer_channel.reveal_timeout - 1
+
+    channel_map, transfers_pair = deepcopy((setup.channel_map, setup.transfers_pair))
+
+    secretreveal_events, balanceproof_events = mediator.events_for_offchain_unlock(
+        setup.channel_map,
+        setup.transfers_pair,
+        random.Random(),
+        safe_block,
+        UNIT_SECRET,
+        UNIT_SECRETHASH,
+    )
+
+    pseudo_random_generator = random.Random()
+    expected_secretreveal_events = mediator.events_for_secretreveal(
+        transfers_pair,
+        UNIT_SECRET,
+        pseudo_random_generator,
+    )
+    expected_balanceproof_events = mediator.events_for_balanceproof(
+        channel_map,
+        transfers_pair,
+        pseudo_random_generator,
+        safe_block,
+        UNIT_SECRET,
+        UNIT_SECRETHASH,
+    )
+
+    def without_message_identifiers(events):
+        for event in events:
+            if hasattr(event, 'message_identifier'):
+                event.message_identifier = 0
+        return events
+
+    assert len(secretreveal_events) == 2
+    assert len(balanceproof_events) == 4
+    assert (
+        without_message_identifiers(secretreveal_events) ==
+        without_message_identifiers(expected_secretreveal_events)
+    )
+    assert (
+        without_message_identifiers(balanceproof_events) ==
+        without_message_identifiers(expected_balanceproof_events)
+    )
+
+    for pair in setup.transfers_pair:
+        assert pair.payer_state == 'payer_secret_revealed'
+        assert pair.payee_state == 'payee_balance_proof'
+
+
 def test_events_for_onchain_secretreveal():
     """ Secret must be registered on-chain when the unsafe region is reached and
     the secret is known.
@@ -1270,6 +1401,16 @@ def test_set_offchain_secret():
     assert payee_channel.partner_state.secrethashes_to_unlockedlocks == dict()
 
 
+def test_get_pairs_channels():
+    """ A channel shared by two pairs must be returned only once. """
+    setup = factories.make_transfers_pair(3)
+
+    channels = mediator.get_pairs_channels(setup.channel_map, setup.transfers_pair)
+
+    assert channels == [setup.channels[0], setup.channels[1], setup.channels[2]]
+    assert mediator.get_pairs_channels(dict(), setup.transfers_pair) == list()
+
+
 def test_mediate_transfer_with_maximum_pending_transfers_exceeded():
     pseudo_random_generator = random.Random()
 
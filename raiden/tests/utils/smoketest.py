@@ -14,13 +14,14 @@ from eth_utils import (
     to_canonical_address,
     to_checksum_address,
 )
-from web3 import HTTPProvider, Web3
+from web3 import Web3
 from web3.middleware import geth_poa_middleware
 
 from raiden.accounts import AccountManager
 from raiden.connection_manager import ConnectionManager
 from raiden.network.proxies import TokenNetworkRegistry
 from raiden.network.rpc.client import JSONRPCClient
+from raiden.network.rpc.provider import PooledHTTPProvider
 from raiden.network.utils import get_free_port
 from raiden.raiden_service import RaidenService
 from raiden.tests.fixtures.variables import DEFAULT_PASSPHRASE
@@ -209,7 +210,7 @@ def setup_testchain_and_raiden(transport, matrix_server, print_step, contracts_v
     )
 
     eth_rpc_endpoint = f'http://127.0.0.1:{rpc_port}'
-    web3 = Web3(HTTPProvider(endpoint_uri=eth_rpc_endpoint))
+    web3 = Web3(PooledHTTPProvider(endpoint_uri=eth_rpc_endpoint))
     web3.middleware_stack.inject(geth_poa_middleware, layer=0)
 
     config = geth_node_config(
@@ -639,18 +639,22 @@ def refund_transfer_matches_received(
     if refund_transfer_sender == received_transfer.target:
         return False
 
+    received_lock = received_transfer.lock
+    refund_lock = refund_transfer.lock
+
+    # The integer fields are compared first, the hashes and addresses last
     return (
         received_transfer.payment_identifier == refund_transfer.payment_identifier and
-        received_transfer.lock.amount == refund_transfer.lock.amount and
-        received_transfer.lock.secrethash == refund_transfer.lock.secrethash and
+        received_lock.amount == refund_lock.amount and
+        received_lock.expiration == refund_lock.expiration and
         received_transfer.target == refund_transfer.target and
-        received_transfer.lock.expiration == refund_transfer.lock.expiration and
 
         # The refund transfer is not tied to the other direction of the same
         # channel, it may reach this node through a different route depending
         # on the path finding strategy
         # original_receiver == refund_transfer_sender and
-        received_transfer.token == refund_transfer.token
+        received_transfer.token == refund_transfer.token and
+        received_lock.secrethash == refund_lock.secrethash
     )
 
 
@@ -661,6 +665,11 @@ def is_valid_refund(
         receiver_state: NettingChannelEndState,
         received_transfer: LockedTransferUnsignedState,
 ) -> MerkletreeOrError:
+    # Matching the transfer fields is cheap, validating the balance proof has to
+    # compute the new merkle tree, so the fields are checked first.
+    if not refund_transfer_matches_received(refund.transfer, received_transfer):
+        return False, 'Refund transfer did not match the received transfer', None
+
     is_valid_locked_transfer, msg, merkletree = valid_lockedtransfer_check(
         channel_state,
         sender_state,
@@ -673,9 +682,6 @@ def is_valid_refund(
     if not is_valid_locked_transfer:
         return False, msg, None
 
-    if not refund_transfer_matches_received(refund.transfer, received_transfer):
-        return False, 'Refund transfer did not match the received transfer', None
-
     return True, '', merkletree
 
 
@@ -834,7 +840,14 @@ def get_distributable(
     """
     _, _, transferred_amount, locked_amount = get_current_balanceproof(sender)
 
-    distributable = get_balance(sender, receiver) - get_amount_locked(sender)
+    # the locked amount is already summed when there is a balance proof, don't
+    # walk all the locks a second time
+    if sender.balance_proof:
+        amount_locked = locked_amount
+    else:
+        amount_locked = get_amount_locked(sender)
+
+    distributable = get_balance(sender, receiver) - amount_locked
 
     overflow_limit = max(
         UINT256_MAX - transferred_amount - locked_amount,
@@ -8,7 +8,7 @@ from raiden.transfer.architecture import (
     SendMessageEvent,
 )
 from raiden.transfer.state import BalanceProofSignedState
-from raiden.utils import pex, serialization, sha3, typing
+from raiden.utils import pex, serialization, sha3_secret, typing
 
 # pylint: disable=too-many-arguments,too-few-public-methods
 
@@ -258,7 +258,7 @@ class ContractSendSecretReveal(ContractSendExpirableEvent):
         self.secret = secret
 
     def __repr__(self):
-        secrethash: typing.SecretHash = typing.SecretHash(sha3(self.secret))
+        secrethash = sha3_secret(self.secret)
         return '<ContractSendSecretReveal secrethash:{}>'.format(secrethash)
 
     def __eq__(self, other):
@@ -4,7 +4,7 @@ from eth_utils import to_canonical_address, to_checksum_address
 from raiden.transfer.architecture import Event, SendMessageEvent
 from raiden.transfer.mediated_transfer.state import LockedTransferUnsignedState
 from raiden.transfer.state import BalanceProofUnsignedState
-from raiden.utils import pex, serialization, sha3, typing
+from raiden.utils import pex, serialization, sha3_secret, typing
 
 # According to the smart contracts as of 07/08:
 # https://github.com/raiden-network/raiden-contracts/blob/fff8646ebcf2c812f40891c2825e12ed03cc7628/raiden_contracts/contracts/TokenNetwork.sol#L213
@@ -175,7 +175,7 @@ class SendSecretReveal(SendMessageEvent):
             message_identifier: typing.MessageID,
             secret: typing.Secret,
     ):
-        secrethash = sha3(secret)
+        secrethash = sha3_secret(secret)
 
         super().__init__(recipient, channel_identifier, message_identifier)
 
@@ -255,7 +255,7 @@ class SendBalanceProof(SendMessageEvent):
         self.payment_identifier = payment_identifier
         self.token = token_address
         self.secret = secret
-        self.secrethash = sha3(secret)
+        self.secrethash = sha3_secret(secret)
         self.balance_proof = balance_proof
 
     def __repr__(self):
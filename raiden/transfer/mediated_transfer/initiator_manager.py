@@ -203,9 +203,9 @@ def handle_transferrefundcancelroute(
     original_transfer = payment_state.initiator.transfer
 
     is_valid_lock = (
-        refund_transfer.lock.secrethash == original_transfer.lock.secrethash and
         refund_transfer.lock.amount == original_transfer.lock.amount and
-        refund_transfer.lock.expiration == original_transfer.lock.expiration
+        refund_transfer.lock.expiration == original_transfer.lock.expiration and
+        refund_transfer.lock.secrethash == original_transfer.lock.secrethash
     )
 
     is_valid_refund = channel.refund_transfer_matches_received(
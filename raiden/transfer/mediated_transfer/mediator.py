@@ -1,6 +1,5 @@
-import itertools
 import random
-from typing import Dict, List, cast
+from typing import Callable, Dict, List, cast
 
 from raiden.constants import MAXIMUM_PENDING_TRANSFERS
 from raiden.settings import DEFAULT_NUMBER_OF_BLOCK_CONFIRMATIONS
@@ -39,31 +38,6 @@ from raiden.transfer.state_change import Block, ContractReceiveSecretReveal, Rec
 from raiden.transfer.utils import is_valid_secret_reveal
 from raiden.utils import typing
 
-STATE_SECRET_KNOWN = (
-    'payee_secret_revealed',
-    'payee_contract_unlock',
-    'payee_balance_proof',
-
-    'payer_secret_revealed',
-    'payer_waiting_unlock',
-    'payer_balance_proof',
-)
-STATE_TRANSFER_PAID = (
-    'payee_contract_unlock',
-    'payee_balance_proof',
-
-    'payer_balance_proof',
-)
-# TODO: fix expired state, it is not final
-STATE_TRANSFER_FINAL = (
-    'payee_contract_unlock',
-    'payee_balance_proof',
-    'payee_expired',
-
-    'payer_balance_proof',
-    'payer_expired',
-)
-
 
 def is_lock_valid(expiration, block_number) -> bool:
     """ True if the lock has not expired. """
@@ -104,20 +78,19 @@ def is_channel_usable(
         transfer_amount: typing.PaymentAmount,
         lock_timeout: typing.BlockTimeout,
 ) -> bool:
-    pending_transfers = channel.get_number_of_pending_transfers(candidate_channel_state.our_state)
-    distributable = channel.get_distributable(
-        candidate_channel_state.our_state,
-        candidate_channel_state.partner_state,
-    )
+    our_state = candidate_channel_state.our_state
+    partner_state = candidate_channel_state.partner_state
 
+    # The timeouts are plain integer comparisons, they are checked before the
+    # balance which has to sum the amounts of all the pending locks
     return (
         lock_timeout > 0 and
-        channel.get_status(candidate_channel_state) == CHANNEL_STATE_OPENED and
         candidate_channel_state.settle_timeout >= lock_timeout and
         candidate_channel_state.reveal_timeout < lock_timeout and
-        pending_transfers < MAXIMUM_PENDING_TRANSFERS and
-        transfer_amount <= distributable and
-        channel.is_valid_amount(candidate_channel_state.our_state, transfer_amount)
+        channel.get_status(candidate_channel_state) == CHANNEL_STATE_OPENED and
+        channel.get_number_of_pending_transfers(our_state) < MAXIMUM_PENDING_TRANSFERS and
+        transfer_amount <= channel.get_distributable(our_state, partner_state) and
+        channel.is_valid_amount(our_state, transfer_amount)
     )
 
 
@@ -177,18 +150,17 @@ def filter_used_routes(
          v         ^
          5 -> 6 -> 7
     """
-    channelid_to_route = {r.channel_identifier: r for r in routes}
-
+    used_channelids = set()
     for pair in transfers_pair:
-        channelid = pair.payer_transfer.balance_proof.channel_identifier
-        if channelid in channelid_to_route:
-            del channelid_to_route[channelid]
-
-        channelid = pair.payee_transfer.balance_proof.channel_identifier
-        if channelid in channelid_to_route:
-            del channelid_to_route[channelid]
+        used_channelids.add(pair.payer_transfer.balance_proof.channel_identifier)
+        used_channelids.add(pair.payee_transfer.balance_proof.channel_identifier)
 
-    return list(channelid_to_route.values())
+    # a single scan over the routes, which keeps them ordered from best to worst
+    return [
+        route
+        for route in routes
+        if route.channel_identifier not in used_channelids
+    ]
 
 
 def get_payee_channel(
@@ -209,29 +181,119 @@ def get_payer_channel(
     return channelidentifiers_to_channels.get(payer_channel_identifier)
 
 
-def get_pending_transfer_pairs(
+def get_pairs_channels(
+        channelidentifiers_to_channels: typing.ChannelMap,
         transfers_pair: typing.List[MediationPairState],
+) -> typing.List[NettingChannelState]:
+    """ Return the payer and payee channels of all the pairs, each only once.
+
+    With refunds the payee channel of a pair is the payer channel of the next
+    one, registering the secret in these channels twice is a no-op.
+    """
+    channel_identifiers: typing.Dict[typing.ChannelID, None] = dict()
+    for pair in transfers_pair:
+        channel_identifiers[pair.payer_transfer.balance_proof.channel_identifier] = None
+        channel_identifiers[pair.payee_transfer.balance_proof.channel_identifier] = None
+
+    return [
+        channelidentifiers_to_channels[channel_identifier]
+        for channel_identifier in channel_identifiers
+        if channel_identifier in channelidentifiers_to_channels
+    ]
+
+
+def get_pairs_by_payer(
+        state: MediatorTransferState,
+        payer_address: typing.Address,
 ) -> typing.List[MediationPairState]:
-    """ Return the transfer pairs that are not at a final state. """
-    pending_pairs = list(
+    """ Return the pairs for which `payer_address` sent the payer transfer.
+
+    Pairs are only appended to transfers_pair, so the index is extended with
+    the pairs added since the last call instead of scanning the whole list.
+    """
+    pairs_by_payer = state.pairs_by_payer
+    for pair in state.transfers_pair[state.pairs_by_payer_length:]:
+        payer = pair.payer_transfer.balance_proof.sender
+        pairs_by_payer.setdefault(payer, list()).append(pair)
+    state.pairs_by_payer_length = len(state.transfers_pair)
+
+    return pairs_by_payer.get(payer_address, list())
+
+
+def get_payer_channels(
+        channelidentifiers_to_channels: typing.ChannelMap,
+        transfers_pair: typing.List[MediationPairState],
+) -> typing.List[NettingChannelState]:
+    """ Return the known payer channels of the pairs. """
+    payer_channels = list()
+    for pair in transfers_pair:
+        channel_state = get_payer_channel(channelidentifiers_to_channels, pair)
+        if channel_state:
+            payer_channels.append(channel_state)
+
+    return payer_channels
+
+
+def get_next_action_block(
+        state: MediatorTransferState,
+        channelidentifiers_to_channels: typing.ChannelMap,
+) -> typing.Optional[typing.BlockNumber]:
+    """ Return the first block at which a lock of the pairs may enter the
+    danger zone or expire, None if it can't be determined.
+
+    This only depends on the lock expirations and the reveal timeout of the
+    payer channels, which don't change, so the result is cached until a new
+    pair is added.
+    """
+    if state.next_action_block_length == len(state.transfers_pair):
+        return state.next_action_block
+
+    expiration_threshold = DEFAULT_NUMBER_OF_BLOCK_CONFIRMATIONS * 2
+    next_action_block: typing.Optional[typing.BlockNumber] = None
+    for pair in state.transfers_pair:
+        payer_channel = get_payer_channel(channelidentifiers_to_channels, pair)
+        if payer_channel is None:
+            next_action_block = None
+            break
+
+        payer_expiration = pair.payer_transfer.lock.expiration
+        pair_action_block = typing.BlockNumber(min(
+            payer_expiration - payer_channel.reveal_timeout,
+            payer_expiration + expiration_threshold,
+            pair.payee_transfer.lock.expiration + expiration_threshold,
+        ))
+
+        if next_action_block is None or pair_action_block < next_action_block:
+            next_action_block = pair_action_block
+
+    state.next_action_block = next_action_block
+    state.next_action_block_length = len(state.transfers_pair)
+
+    return next_action_block
+
+
+def get_pending_transfer_pairs(
+        transfers_pair: typing.List[MediationPairState],
+) -> typing.Iterator[MediationPairState]:
+    """ Iterate over the transfer pairs that are not at a final state.
+
+    The pairs are filtered lazily, callers only iterate over them once and may
+    change the state of the current pair while doing so.
+    """
+    return (
         pair
         for pair in transfers_pair
-        if pair.payee_state not in STATE_TRANSFER_FINAL or
-        pair.payer_state not in STATE_TRANSFER_FINAL
+        if not pair.payee_final or not pair.payer_final
     )
-    return pending_pairs
 
 
 def sanity_check(state: MediatorTransferState) -> None:
     """ Check invariants that must hold. """
 
-    # if a transfer is paid we must know the secret
-    all_transfers_states = itertools.chain(
-        (pair.payee_state for pair in state.transfers_pair),
-        (pair.payer_state for pair in state.transfers_pair),
-    )
-    if any(state in STATE_TRANSFER_PAID for state in all_transfers_states):
-        assert state.secret is not None
+    # if a transfer is paid we must know the secret, once the secret is known
+    # there is no need to scan the pairs
+    if state.secret is None:
+        assert not any(pair.payee_paid or pair.payer_paid for pair in state.transfers_pair)
 
     # the "transitivity" for these values is checked below as part of
     # almost_equal check
@@ -451,26 +513,12 @@ def set_offchain_secret(
     """ Set the secret to all mediated transfers. """
     state.secret = secret
 
-    for pair in state.transfers_pair:
-        payer_channel = channelidentifiers_to_channels.get(
-            pair.payer_transfer.balance_proof.channel_identifier,
+    for channel_state in get_pairs_channels(channelidentifiers_to_channels, state.transfers_pair):
+        channel.register_offchain_secret(
+            channel_state,
+            secret,
+            secrethash,
         )
-        if payer_channel:
-            channel.register_offchain_secret(
-                payer_channel,
-                secret,
-                secrethash,
-            )
-
-        payee_channel = channelidentifiers_to_channels.get(
-            pair.payee_transfer.balance_proof.channel_identifier,
-        )
-        if payee_channel:
-            channel.register_offchain_secret(
-                payee_channel,
-                secret,
-                secrethash,
-            )
 
     # The secret should never be revealed if `waiting_transfer` is not None.
     # For this to happen this node must have received a transfer, which it did
@@ -513,28 +561,13 @@ def set_onchain_secret(
     """
     state.secret = secret
 
-    for pair in state.transfers_pair:
-        payer_channel = channelidentifiers_to_channels.get(
-            pair.payer_transfer.balance_proof.channel_identifier,
-        )
-        if payer_channel:
-            channel.register_onchain_secret(
-                payer_channel,
-                secret,
-                secrethash,
-                block_number,
-            )
-
-        payee_channel = channelidentifiers_to_channels.get(
-            pair.payee_transfer.balance_proof.channel_identifier,
+    for channel_state in get_pairs_channels(channelidentifiers_to_channels, state.transfers_pair):
+        channel.register_onchain_secret(
+            channel_state=channel_state,
+            secret=secret,
+            secrethash=secrethash,
+            secret_reveal_block_number=block_number,
         )
-        if payee_channel:
-            channel.register_onchain_secret(
-                channel_state=payee_channel,
-                secret=secret,
-                secrethash=secrethash,
-                secret_reveal_block_number=block_number,
-            )
 
     # Like the off-chain secret reveal, the secret should never be revealed
     # on-chain if there is a waiting transfer.
@@ -576,10 +609,8 @@ def events_for_expired_pairs(
         block_number: typing.BlockNumber,
 ) -> typing.List[Event]:
     """ Informational events for expired locks. """
-    pending_transfers_pairs = get_pending_transfer_pairs(transfers_pair)
-
     events: typing.List[Event] = list()
-    for pair in pending_transfers_pairs:
+    for pair in get_pending_transfer_pairs(transfers_pair):
         payer_balance_proof = pair.payer_transfer.balance_proof
         payer_channel = channelidentifiers_to_channels.get(payer_balance_proof.channel_identifier)
         if not payer_channel:
@@ -629,6 +660,110 @@ def events_for_expired_pairs(
     return events
 
 
+def events_for_pair_secretreveal(
+        pair: MediationPairState,
+        secret: typing.Secret,
+        pseudo_random_generator: random.Random,
+        events: typing.List[Event],
+) -> None:
+    """ Reveal the secret to the payer of `pair` once the payee knows it.
+
+    The event is appended to `events`, so that the loops over the pairs don't
+    allocate a list per pair.
+    """
+    payee_knows_secret = pair.payee_secret_known
+    payer_knows_secret = pair.payer_secret_known
+    is_transfer_pending = pair.payer_state == 'payer_pending'
+
+    should_send_secret = (
+        payee_knows_secret and
+        not payer_knows_secret and
+        is_transfer_pending
+    )
+
+    if should_send_secret:
+        message_identifier = message_identifier_from_prng(pseudo_random_generator)
+        pair.payer_state = 'payer_secret_revealed'
+        payer_transfer = pair.payer_transfer
+        revealsecret = SendSecretReveal(
+            recipient=payer_transfer.balance_proof.sender,
+            channel_identifier=CHANNEL_IDENTIFIER_GLOBAL_QUEUE,
+            message_identifier=message_identifier,
+            secret=secret,
+        )
+
+        events.append(revealsecret)
+
+
+def events_for_pair_balanceproof(
+        channelidentifiers_to_channels: typing.ChannelMap,
+        pair: MediationPairState,
+        pseudo_random_generator: random.Random,
+        block_number: typing.BlockNumber,
+        secret: typing.Secret,
+        secrethash: typing.SecretHash,
+        events: typing.List[Event],
+) -> None:
+    """ Unlock the payee transfer of `pair` off-chain if it's safe, the events
+    are appended to `events`.
+    """
+    payee_knows_secret = pair.payee_secret_known
+    payee_payed = pair.payee_paid
+
+    # Check the pair state first, the channels and the lock timeout only
+    # matter for the pairs which can be unlocked
+    if not payee_knows_secret or payee_payed:
+        return
+
+    payee_channel = get_payee_channel(channelidentifiers_to_channels, pair)
+    payee_channel_open = (
+        payee_channel and channel.get_status(payee_channel) == CHANNEL_STATE_OPENED
+    )
+
+    payer_channel = get_payer_channel(channelidentifiers_to_channels, pair)
+
+    # The mediator must not send to the payee a balance proof if the lock
+    # is in the danger zone, because the payer may not do the same and the
+    # on-chain unlock may fail. If the lock is nearing it's expiration
+    # block, then on-chain unlock should be done, and if successful it can
+    # be unlocked off-chain.
+    is_safe_to_send_balanceproof = False
+    if payer_channel:
+        is_safe_to_send_balanceproof, _ = is_safe_to_wait(
+            pair.payer_transfer.lock.expiration,
+            payer_channel.reveal_timeout,
+            block_number,
+        )
+
+    should_send_balanceproof_to_payee = (
+        payee_channel_open and
+        is_safe_to_send_balanceproof
+    )
+
+    if should_send_balanceproof_to_payee:
+        # At this point we are sure that payee_channel exists due to the
+        # payee_channel_open check above. So let mypy know about this
+        assert payee_channel
+        payee_channel = cast(NettingChannelState, payee_channel)
+        pair.payee_state = 'payee_balance_proof'
+
+        message_identifier = message_identifier_from_prng(pseudo_random_generator)
+        unlock_lock = channel.send_unlock(
+            channel_state=payee_channel,
+            message_identifier=message_identifier,
+            payment_identifier=pair.payee_transfer.payment_identifier,
+            secret=secret,
+            secrethash=secrethash,
+        )
+
+        unlock_success = EventUnlockSuccess(
+            pair.payer_transfer.payment_identifier,
+            pair.payer_transfer.lock.secrethash,
+        )
+        events.append(unlock_lock)
+        events.append(unlock_success)
+
+
 def events_for_secretreveal(
         transfers_pair: typing.List[MediationPairState],
         secret: typing.Secret,
@@ -659,29 +794,13 @@ def events_for_secretreveal(
     """
     events: List[Event] = list()
     for pair in reversed(transfers_pair):
-        payee_knows_secret = pair.payee_state in STATE_SECRET_KNOWN
-        payer_knows_secret = pair.payer_state in STATE_SECRET_KNOWN
-        is_transfer_pending = pair.payer_state == 'payer_pending'
-
-        should_send_secret = (
-            payee_knows_secret and
-            not payer_knows_secret and
-            is_transfer_pending
+        events_for_pair_secretreveal(
+            pair,
+            secret,
+            pseudo_random_generator,
+            events,
         )
 
-        if should_send_secret:
-            message_identifier = message_identifier_from_prng(pseudo_random_generator)
-            pair.payer_state = 'payer_secret_revealed'
-            payer_transfer = pair.payer_transfer
-            revealsecret = SendSecretReveal(
-                recipient=payer_transfer.balance_proof.sender,
-                channel_identifier=CHANNEL_IDENTIFIER_GLOBAL_QUEUE,
-                message_identifier=message_identifier,
-                secret=secret,
-            )
-
-            events.append(revealsecret)
-
     return events
 
 
@@ -697,60 +816,56 @@ def events_for_balanceproof(
 
     events: List[Event] = list()
     for pair in reversed(transfers_pair):
-        payee_knows_secret = pair.payee_state in STATE_SECRET_KNOWN
-        payee_payed = pair.payee_state in STATE_TRANSFER_PAID
-
-        payee_channel = get_payee_channel(channelidentifiers_to_channels, pair)
-        payee_channel_open = (
-            payee_channel and channel.get_status(payee_channel) == CHANNEL_STATE_OPENED
+        events_for_pair_balanceproof(
+            channelidentifiers_to_channels,
+            pair,
+            pseudo_random_generator,
+            block_number,
+            secret,
+            secrethash,
+            events,
         )
 
-        payer_channel = get_payer_channel(channelidentifiers_to_channels, pair)
+    return events
 
-        # The mediator must not send to the payee a balance proof if the lock
-        # is in the danger zone, because the payer may not do the same and the
-        # on-chain unlock may fail. If the lock is nearing it's expiration
-        # block, then on-chain unlock should be done, and if successful it can
-        # be unlocked off-chain.
-        is_safe_to_send_balanceproof = False
-        if payer_channel:
-            is_safe_to_send_balanceproof, _ = is_safe_to_wait(
-                pair.payer_transfer.lock.expiration,
-                payer_channel.reveal_timeout,
-                block_number,
-            )
 
-        should_send_balanceproof_to_payee = (
-            payee_channel_open and
-            payee_knows_secret and
-            not payee_payed and
-            is_safe_to_send_balanceproof
+def events_for_offchain_unlock(
+        channelidentifiers_to_channels: typing.ChannelMap,
+        transfers_pair: typing.List[MediationPairState],
+        pseudo_random_generator: random.Random,
+        block_number: typing.BlockNumber,
+        secret: typing.Secret,
+        secrethash: typing.SecretHash,
+) -> typing.Tuple[typing.List[Event], typing.List[Event]]:
+    """ Same as `events_for_secretreveal` followed by
+    `events_for_balanceproof`, done in a single pass over the pairs.
+
+    The two are independent for a given pair, the reveal only changes the
+    payer state and the balance proof only the payee state, so the same events
+    are returned as a tuple `(secret_reveal_events, balance_proof_events)`.
+    Only their message identifiers differ, because the draws from the
+    `pseudo_random_generator` are interleaved.
+    """
+    secretreveal_events: List[Event] = list()
+    balanceproof_events: List[Event] = list()
+    for pair in reversed(transfers_pair):
+        events_for_pair_secretreveal(
+            pair,
+            secret,
+            pseudo_random_generator,
+            secretreveal_events,
+        )
+        events_for_pair_balanceproof(
+            channelidentifiers_to_channels,
+            pair,
+            pseudo_random_generator,
+            block_number,
+            secret,
+            secrethash,
+            balanceproof_events,
         )
 
-        if should_send_balanceproof_to_payee:
-            # At this point we are sure that payee_channel exists due to the
-            # payee_channel_open check above. So let mypy know about this
-            assert payee_channel
-            payee_channel = cast(NettingChannelState, payee_channel)
-            pair.payee_state = 'payee_balance_proof'
-
-            message_identifier = message_identifier_from_prng(pseudo_random_generator)
-            unlock_lock = channel.send_unlock(
-                channel_state=payee_channel,
-                message_identifier=message_identifier,
-                payment_identifier=pair.payee_transfer.payment_identifier,
-                secret=secret,
-                secrethash=secrethash,
-            )
-
-            unlock_success = EventUnlockSuccess(
-                pair.payer_transfer.payment_identifier,
-                pair.payer_transfer.lock.secrethash,
-            )
-            events.append(unlock_lock)
-            events.append(unlock_success)
-
-    return events
+    return secretreveal_events, balanceproof_events
 
 
 def events_for_onchain_secretreveal_if_dangerzone(
@@ -764,17 +879,10 @@ def events_for_onchain_secretreveal_if_dangerzone(
     """
     events: typing.List[Event] = list()
 
-    all_payer_channels = []
-    for pair in transfers_pair:
-        channel_state = get_payer_channel(channelmap, pair)
-        if channel_state:
-            all_payer_channels.append(channel_state)
-
-    transaction_sent = has_secret_registration_started(
-        all_payer_channels,
-        transfers_pair,
-        secrethash,
-    )
+    # Whether a registration was already started is only needed once a lock is
+    # in the danger zone, which doesn't happen for most blocks. It is computed
+    # before any of the pair states below is changed.
+    transaction_sent = None
 
     # Only consider the transfers which have a pair. This means if we have a
     # waiting transfer and for some reason the node knows the secret, it will
@@ -789,18 +897,30 @@ def events_for_onchain_secretreveal_if_dangerzone(
 
         lock = pair.payer_transfer.lock
 
+        secret_known = channel.is_secret_known(
+            payer_channel.partner_state,
+            lock.secrethash,
+        )
+
+        # Without the secret there is nothing to register, don't bother
+        # checking the lock timeout
+        if not secret_known:
+            continue
+
         safe_to_wait, _ = is_safe_to_wait(
             lock.expiration,
             payer_channel.reveal_timeout,
             block_number,
         )
 
-        secret_known = channel.is_secret_known(
-            payer_channel.partner_state,
-            pair.payer_transfer.lock.secrethash,
-        )
+        if not safe_to_wait:
+            if transaction_sent is None:
+                transaction_sent = has_secret_registration_started(
+                    get_payer_channels(channelmap, transfers_pair),
+                    transfers_pair,
+                    secrethash,
+                )
 
-        if not safe_to_wait and secret_known:
             pair.payer_state = 'payer_waiting_secret_reveal'
 
             if not transaction_sent:
@@ -840,13 +960,8 @@ def events_for_onchain_secretreveal_if_closed(
     """
     events = list()
 
-    all_payer_channels = []
-    for pair in transfers_pair:
-        channel_state = get_payer_channel(channelmap, pair)
-        if channel_state:
-            all_payer_channels.append(channel_state)
     transaction_sent = has_secret_registration_started(
-        all_payer_channels,
+        get_payer_channels(channelmap, transfers_pair),
         transfers_pair,
         secrethash,
     )
@@ -964,13 +1079,7 @@ def secret_learned(
         secrethash,
     )
 
-    offchain_secret_reveal = events_for_secretreveal(
-        state.transfers_pair,
-        secret,
-        pseudo_random_generator,
-    )
-
-    balance_proof = events_for_balanceproof(
+    offchain_secret_reveal, balance_proof = events_for_offchain_unlock(
         channelidentifiers_to_channels,
         state.transfers_pair,
         pseudo_random_generator,
@@ -979,10 +1088,13 @@ def secret_learned(
         secrethash,
     )
 
-    iteration = TransitionResult(
-        state,
-        secret_reveal_events + offchain_secret_reveal + balance_proof + onchain_secret_reveal,
-    )
+    events: List[Event] = list()
+    events.extend(secret_reveal_events)
+    events.extend(offchain_secret_reveal)
+    events.extend(balance_proof)
+    events.extend(onchain_secret_reveal)
+
+    iteration = TransitionResult(state, events)
 
     return iteration
 
@@ -1110,6 +1222,23 @@ def handle_block(
     Return:
         TransitionResult: The resulting iteration
     """
+    # Most blocks don't change anything for the mediator, the locks are
+    # neither expired nor in the danger zone and a waiting transfer was
+    # already handled.
+    next_action_block = get_next_action_block(
+        mediator_state,
+        channelidentifiers_to_channels,
+    )
+    waiting_transfer = mediator_state.waiting_transfer
+    has_waiting_transfer = waiting_transfer and waiting_transfer.state != 'expired'
+    is_idle_block = (
+        next_action_block is not None and
+        state_change.block_number < next_action_block and
+        not has_waiting_transfer
+    )
+    if is_idle_block:
+        return TransitionResult(mediator_state, list())
+
     expired_locks_events = events_to_remove_expired_locks(
         mediator_state,
         channelidentifiers_to_channels,
@@ -1131,10 +1260,12 @@ def handle_block(
         state_change.block_number,
     )
 
-    iteration = TransitionResult(
-        mediator_state,
-        unlock_fail_events + secret_reveal_events + expired_locks_events,
-    )
+    events: List[Event] = list()
+    events.extend(unlock_fail_events)
+    events.extend(secret_reveal_events)
+    events.extend(expired_locks_events)
+
+    iteration = TransitionResult(mediator_state, events)
 
     return iteration
 
@@ -1213,6 +1344,11 @@ def handle_offchain_secretreveal(
     )
     is_secret_unknown = mediator_state.secret is None
 
+    # The secret is revealed by every hop of the path, most reveals are
+    # duplicates which don't need the payer channel
+    if not is_secret_unknown or not is_valid_reveal:
+        return TransitionResult(mediator_state, list())
+
     # a SecretReveal should be rejected if the payer transfer
     # has expired. To check for this, we use the last
     # transfer pair.
@@ -1229,7 +1365,7 @@ def handle_offchain_secretreveal(
         block_number=block_number,
     )
 
-    if is_secret_unknown and is_valid_reveal and not has_payer_transfer_expired:
+    if not has_payer_transfer_expired:
         iteration = secret_learned(
             mediator_state,
             channelidentifiers_to_channels,
@@ -1301,32 +1437,31 @@ def handle_unlock(
     balance_proof_sender = state_change.balance_proof.sender
     channel_identifier = state_change.balance_proof.channel_identifier
 
-    for pair in mediator_state.transfers_pair:
-        if pair.payer_transfer.balance_proof.sender == balance_proof_sender:
-            channel_state = channelidentifiers_to_channels.get(channel_identifier)
+    for pair in get_pairs_by_payer(mediator_state, balance_proof_sender):
+        channel_state = channelidentifiers_to_channels.get(channel_identifier)
 
-            if channel_state:
-                is_valid, channel_events, _ = channel.handle_unlock(
-                    channel_state,
-                    state_change,
-                )
-                events.extend(channel_events)
+        if channel_state:
+            is_valid, channel_events, _ = channel.handle_unlock(
+                channel_state,
+                state_change,
+            )
+            events.extend(channel_events)
 
-                if is_valid:
-                    unlock = EventUnlockClaimSuccess(
-                        pair.payee_transfer.payment_identifier,
-                        pair.payee_transfer.lock.secrethash,
-                    )
-                    events.append(unlock)
+            if is_valid:
+                unlock = EventUnlockClaimSuccess(
+                    pair.payee_transfer.payment_identifier,
+                    pair.payee_transfer.lock.secrethash,
+                )
+                events.append(unlock)
 
-                    send_processed = SendProcessed(
-                        recipient=balance_proof_sender,
-                        channel_identifier=CHANNEL_IDENTIFIER_GLOBAL_QUEUE,
-                        message_identifier=state_change.message_identifier,
-                    )
-                    events.append(send_processed)
+                send_processed = SendProcessed(
+                    recipient=balance_proof_sender,
+                    channel_identifier=CHANNEL_IDENTIFIER_GLOBAL_QUEUE,
+                    message_identifier=state_change.message_identifier,
+                )
+                events.append(send_processed)
 
-                    pair.payer_state = 'payer_balance_proof'
+                pair.payer_state = 'payer_balance_proof'
 
     iteration = TransitionResult(mediator_state, events)
     return iteration
@@ -1374,6 +1509,133 @@ def handle_lock_expired(
     return TransitionResult(mediator_state, events)
 
 
+# The handlers of the state changes of an existing mediator task have
+# different signatures, the dispatch_* adapters give all of them the
+# signature of state_transition so the handler tables can be typed.
+StateChangeHandler = Callable[
+    [
+        MediatorTransferState,
+        StateChange,
+        typing.ChannelMap,
+        random.Random,
+        typing.BlockNumber,
+    ],
+    TransitionResult,
+]
+
+
+def dispatch_block(
+        mediator_state: MediatorTransferState,
+        state_change: StateChange,
+        channelidentifiers_to_channels: typing.ChannelMap,
+        pseudo_random_generator: random.Random,
+        block_number: typing.BlockNumber,
+) -> TransitionResult:
+    return handle_block(
+        mediator_state,
+        cast(Block, state_change),
+        channelidentifiers_to_channels,
+        pseudo_random_generator,
+    )
+
+
+def dispatch_refundtransfer(
+        mediator_state: MediatorTransferState,
+        state_change: StateChange,
+        channelidentifiers_to_channels: typing.ChannelMap,
+        pseudo_random_generator: random.Random,
+        block_number: typing.BlockNumber,
+) -> TransitionResult:
+    return handle_refundtransfer(
+        mediator_state,
+        cast(ReceiveTransferRefund, state_change),
+        channelidentifiers_to_channels,
+        pseudo_random_generator,
+        block_number,
+    )
+
+
+def dispatch_offchain_secretreveal(
+        mediator_state: MediatorTransferState,
+        state_change: StateChange,
+        channelidentifiers_to_channels: typing.ChannelMap,
+        pseudo_random_generator: random.Random,
+        block_number: typing.BlockNumber,
+) -> TransitionResult:
+    return handle_offchain_secretreveal(
+        mediator_state,
+        cast(ReceiveSecretReveal, state_change),
+        channelidentifiers_to_channels,
+        pseudo_random_generator,
+        block_number,
+    )
+
+
+def dispatch_onchain_secretreveal(
+        mediator_state: MediatorTransferState,
+        state_change: StateChange,
+        channelidentifiers_to_channels: typing.ChannelMap,
+        pseudo_random_generator: random.Random,
+        block_number: typing.BlockNumber,
+) -> TransitionResult:
+    return handle_onchain_secretreveal(
+        mediator_state,
+        cast(ContractReceiveSecretReveal, state_change),
+        channelidentifiers_to_channels,
+        pseudo_random_generator,
+        block_number,
+    )
+
+
+def dispatch_unlock(
+        mediator_state: MediatorTransferState,
+        state_change: StateChange,
+        channelidentifiers_to_channels: typing.ChannelMap,
+        pseudo_random_generator: random.Random,
+        block_number: typing.BlockNumber,
+) -> TransitionResult:
+    return handle_unlock(
+        mediator_state,
+        cast(ReceiveUnlock, state_change),
+        channelidentifiers_to_channels,
+    )
+
+
+def dispatch_lock_expired(
+        mediator_state: MediatorTransferState,
+        state_change: StateChange,
+        channelidentifiers_to_channels: typing.ChannelMap,
+        pseudo_random_generator: random.Random,
+        block_number: typing.BlockNumber,
+) -> TransitionResult:
+    return handle_lock_expired(
+        mediator_state,
+        cast(ReceiveLockExpired, state_change),
+        channelidentifiers_to_channels,
+        block_number,
+    )
+
+
+# Handlers for the state changes of an existing mediator task, keyed by the
+# exact type of the state change.
+STATE_CHANGE_HANDLERS: Dict[type, StateChangeHandler] = {
+    Block: dispatch_block,
+    ReceiveTransferRefund: dispatch_refundtransfer,
+    ReceiveSecretReveal: dispatch_offchain_secretreveal,
+    ContractReceiveSecretReveal: dispatch_onchain_secretreveal,
+    ReceiveUnlock: dispatch_unlock,
+    ReceiveLockExpired: dispatch_lock_expired,
+}
+
+# Once the secret is known an off-chain secret reveal can't change the state
+# anymore, the handler is not even looked up.
+SECRET_KNOWN_HANDLERS: Dict[type, StateChangeHandler] = {
+    state_change_type: handler
+    for state_change_type, handler in STATE_CHANGE_HANDLERS.items()
+    if state_change_type is not ReceiveSecretReveal
+}
+
+
 def state_transition(
         mediator_state: MediatorTransferState,
         state_change: StateChange,
@@ -1382,16 +1644,16 @@ def state_transition(
         block_number: typing.BlockNumber,
 ) -> TransitionResult:
     """ State machine for a node mediating a transfer. """
-    # pylint: disable=too-many-branches
     # Notes:
     # - A user cannot cancel a mediated transfer after it was initiated, she
     #   may only reject to mediate before hand. This is because the mediator
     #   doesn't control the secret reveal and needs to wait for the lock
     #   expiration before safely discarding the transfer.
 
+    state_change_type = type(state_change)
     iteration = TransitionResult(mediator_state, list())
 
-    if isinstance(state_change, ActionInitMediator):
+    if state_change_type is ActionInitMediator:
         if mediator_state is None:
             iteration = handle_init(
                 state_change,
@@ -1399,56 +1661,23 @@ def state_transition(
                 pseudo_random_generator,
                 block_number,
             )
+    else:
+        # A mediator spends its life in two modes, before and after learning
+        # the secret, each mode has its own table of handlers.
+        if mediator_state.secret is None:
+            handlers = STATE_CHANGE_HANDLERS
+        else:
+            handlers = SECRET_KNOWN_HANDLERS
 
-    elif isinstance(state_change, Block):
-        iteration = handle_block(
-            mediator_state,
-            state_change,
-            channelidentifiers_to_channels,
-            pseudo_random_generator,
-        )
-
-    elif isinstance(state_change, ReceiveTransferRefund):
-        iteration = handle_refundtransfer(
-            mediator_state,
-            state_change,
-            channelidentifiers_to_channels,
-            pseudo_random_generator,
-            block_number,
-        )
-
-    elif isinstance(state_change, ReceiveSecretReveal):
-        iteration = handle_offchain_secretreveal(
-            mediator_state,
-            state_change,
-            channelidentifiers_to_channels,
-            pseudo_random_generator,
-            block_number,
-        )
-
-    elif isinstance(state_change, ContractReceiveSecretReveal):
-        iteration = handle_onchain_secretreveal(
-            mediator_state,
-            state_change,
-            channelidentifiers_to_channels,
-            pseudo_random_generator,
-            block_number,
-        )
-
-    elif isinstance(state_change, ReceiveUnlock):
-        iteration = handle_unlock(
-            mediator_state,
-            state_change,
-            channelidentifiers_to_channels,
-        )
-
-    elif isinstance(state_change, ReceiveLockExpired):
-        iteration = handle_lock_expired(
-            mediator_state,
-            state_change,
-            channelidentifiers_to_channels,
-            block_number,
-        )
+        handler = handlers.get(state_change_type)
+        if handler is not None:
+            iteration = handler(
+                mediator_state,
+                state_change,
+                channelidentifiers_to_channels,
+                pseudo_random_generator,
+                block_number,
+            )
 
     # this is the place for paranoia
     if iteration.new_state is not None:
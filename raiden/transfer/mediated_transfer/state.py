@@ -10,7 +10,44 @@ from raiden.transfer.state import (
     RouteState,
     balanceproof_from_envelope,
 )
-from raiden.utils import pex, serialization, sha3, typing
+from raiden.utils import pex, serialization, sha3_secret, typing
+
+STATE_SECRET_KNOWN = frozenset((
+    'payee_secret_revealed',
+    'payee_contract_unlock',
+    'payee_balance_proof',
+
+    'payer_secret_revealed',
+    'payer_waiting_unlock',
+    'payer_balance_proof',
+))
+STATE_TRANSFER_PAID = frozenset((
+    'payee_contract_unlock',
+    'payee_balance_proof',
+
+    'payer_balance_proof',
+))
+# TODO: fix expired state, it is not final
+STATE_TRANSFER_FINAL = frozenset((
+    'payee_contract_unlock',
+    'payee_balance_proof',
+    'payee_expired',
+
+    'payer_balance_proof',
+    'payer_expired',
+))
+
+# The (secret_known, paid, final) flags of every pair state, states not listed
+# here have all the flags unset
+STATE_FLAGS = {
+    state: (
+        state in STATE_SECRET_KNOWN,
+        state in STATE_TRANSFER_PAID,
+        state in STATE_TRANSFER_FINAL,
+    )
+    for state in STATE_SECRET_KNOWN | STATE_TRANSFER_PAID | STATE_TRANSFER_FINAL
+}
+STATE_NO_FLAGS = (False, False, False)
 
 
 def lockedtransfersigned_from_message(message):
@@ -162,6 +199,12 @@ class InitiatorTransferState(State):
 
 
 class WaitingTransferState(State):
+
+    __slots__ = (
+        'transfer',
+        'state',
+    )
+
     def __init__(
             self,
             transfer: 'LockedTransferSignedState',
@@ -212,8 +255,18 @@ class MediatorTransferState(State):
     __slots__ = (
         'secrethash',
         'secret',
-        'transfers_pair',
+        '_transfers_pair',
         'waiting_transfer',
+
+        # Index of transfers_pair by the payer address, it is filled lazily by
+        # the mediator and is not serialized
+        'pairs_by_payer',
+        'pairs_by_payer_length',
+
+        # First block at which a lock of transfers_pair may expire or be in
+        # the danger zone, computed by the mediator and not serialized
+        'next_action_block',
+        'next_action_block_length',
     )
 
     def __init__(self, secrethash: typing.SecretHash):
@@ -228,6 +281,18 @@ class MediatorTransferState(State):
             len(self.transfers_pair),
         )
 
+    @property
+    def transfers_pair(self) -> typing.List['MediationPairState']:
+        return self._transfers_pair
+
+    @transfers_pair.setter
+    def transfers_pair(self, transfers_pair: typing.List['MediationPairState']):
+        self._transfers_pair = transfers_pair
+        self.pairs_by_payer: typing.Dict[typing.Address, typing.List[MediationPairState]] = dict()
+        self.pairs_by_payer_length = 0
+        self.next_action_block: typing.Optional[typing.BlockNumber] = None
+        self.next_action_block_length: typing.Optional[int] = None
+
     def __eq__(self, other):
         return (
             isinstance(other, MediatorTransferState) and
@@ -562,7 +627,7 @@ class TransferDescriptionWithSecretState(State):
             target: typing.TargetAddress,
             secret: typing.Secret,
     ):
-        secrethash = sha3(secret)
+        secrethash = sha3_secret(secret)
 
         self.payment_network_identifier = payment_network_identifier
         self.payment_identifier = payment_identifier
@@ -637,9 +702,18 @@ class MediationPairState(State):
     __slots__ = (
         'payee_address',
         'payee_transfer',
-        'payee_state',
+        '_payee_state',
         'payer_transfer',
-        'payer_state',
+        '_payer_state',
+
+        # Derived from the states above, these are updated on every state
+        # change and are not serialized
+        'payee_secret_known',
+        'payee_paid',
+        'payee_final',
+        'payer_secret_known',
+        'payer_paid',
+        'payer_final',
     )
 
     # payee_pending:
@@ -706,6 +780,30 @@ class MediationPairState(State):
             self.payee_transfer,
         )
 
+    @property
+    def payee_state(self) -> str:
+        return self._payee_state
+
+    @payee_state.setter
+    def payee_state(self, payee_state: str):
+        self._payee_state = payee_state
+        self.payee_secret_known, self.payee_paid, self.payee_final = STATE_FLAGS.get(
+            payee_state,
+            STATE_NO_FLAGS,
+        )
+
+    @property
+    def payer_state(self) -> str:
+        return self._payer_state
+
+    @payer_state.setter
+    def payer_state(self, payer_state: str):
+        self._payer_state = payer_state
+        self.payer_secret_known, self.payer_paid, self.payer_final = STATE_FLAGS.get(
+            payer_state,
+            STATE_NO_FLAGS,
+        )
+
     @property
     def payer_address(self):
         return self.payer_transfer.payer_address
@@ -13,7 +13,7 @@ from raiden.transfer.mediated_transfer.state import (
     TransferDescriptionWithSecretState,
 )
 from raiden.transfer.state import BalanceProofSignedState, RouteState
-from raiden.utils import pex, sha3, typing
+from raiden.utils import pex, sha3_secret, typing
 from raiden.utils.serialization import deserialize_bytes, serialize_bytes
 
 # Note: The init states must contain all the required data for trying doing
@@ -351,7 +351,7 @@ class ReceiveSecretReveal(AuthenticatedSenderStateChange):
             sender: typing.Address,
     ):
         super().__init__(sender)
-        secrethash = sha3(secret)
+        secrethash = sha3_secret(secret)
 
         self.secret = secret
         self.secrethash = secrethash
@@ -386,7 +386,7 @@ class ReceiveSecretReveal(AuthenticatedSenderStateChange):
             secret=deserialize_bytes(data['secret']),
             sender=to_canonical_address(data['sender']),
         )
-        instance.secrethash = deserialize_bytes(data['secrethash'])
+        instance.secrethash = typing.SecretHash(deserialize_bytes(data['secrethash']))
         return instance
 
 
@@ -404,7 +404,7 @@ class ReceiveTransferRefundCancelRoute(BalanceProofStateChange):
         if not isinstance(transfer, LockedTransferSignedState):
             raise ValueError('transfer must be an instance of LockedTransferSignedState')
 
-        secrethash = sha3(secret)
+        secrethash = sha3_secret(secret)
 
         super().__init__(transfer.balance_proof)
         self.transfer = transfer
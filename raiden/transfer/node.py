@@ -125,6 +125,10 @@ def subdispatch_to_all_lockedtransfers(
 ) -> TransitionResult:
     events = list()
 
+    # The payment tasks are not independent and must be dispatched one at a
+    # time in a fixed order: they draw message identifiers from the shared
+    # pseudo random generator, which has to be deterministic to replay the
+    # WAL, and tasks of the same token network update the same channels.
     for secrethash in list(chain_state.payment_mapping.secrethashes_to_task.keys()):
         result = subdispatch_to_paymenttask(chain_state, state_change, secrethash)
         events.extend(result.events)
@@ -1193,6 +1193,12 @@ class TransactionExecutionStatus(State):
         FAILURE,
     )
 
+    __slots__ = (
+        'started_block_number',
+        'finished_block_number',
+        'result',
+    )
+
     def __init__(
             self,
             started_block_number: Optional[typing.BlockNumber] = None,
@@ -1693,6 +1699,12 @@ class TransactionChannelNewBalance(State):
 
 @total_ordering
 class TransactionOrder(State):
+
+    __slots__ = (
+        'block_number',
+        'transaction',
+    )
+
     def __init__(
             self,
             block_number: typing.BlockNumber,
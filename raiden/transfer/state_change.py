@@ -15,7 +15,7 @@ from raiden.transfer.state import (
     TransactionChannelNewBalance,
 )
 from raiden.transfer.utils import pseudo_random_generator_from_json
-from raiden.utils import pex, sha3, typing
+from raiden.utils import pex, sha3_secret, typing
 from raiden.utils.serialization import deserialize_bytes, serialize_bytes
 
 
@@ -1062,7 +1062,7 @@ class ReceiveUnlock(BalanceProofStateChange):
 
         super().__init__(balance_proof)
 
-        secrethash: typing.SecretHash = typing.SecretHash(sha3(secret))
+        secrethash = sha3_secret(secret)
 
         self.message_identifier = message_identifier
         self.secret = secret
@@ -7,7 +7,7 @@ import filelock
 import structlog
 from eth_utils import encode_hex, to_canonical_address, to_checksum_address, to_normalized_address
 from requests.exceptions import ConnectTimeout
-from web3 import HTTPProvider, Web3
+from web3 import Web3
 
 from raiden.constants import SQLITE_MIN_REQUIRED_VERSION, Environment
 from raiden.exceptions import (
@@ -22,6 +22,7 @@ from raiden.message_handler import MessageHandler
 from raiden.network.blockchain_service import BlockChainService
 from raiden.network.discovery import ContractDiscovery
 from raiden.network.rpc.client import JSONRPCClient
+from raiden.network.rpc.provider import PooledHTTPProvider
 from raiden.network.throttle import TokenBucket
 from raiden.network.transport import MatrixTransport, UDPTransport
 from raiden.raiden_event_handler import RaidenEventHandler
@@ -84,7 +85,7 @@ def _assert_sql_version():
 
 
 def _setup_web3(eth_rpc_endpoint):
-    web3 = Web3(HTTPProvider(eth_rpc_endpoint))
+    web3 = Web3(PooledHTTPProvider(eth_rpc_endpoint))
 
     try:
         node_version = web3.version.node  # pylint: disable=no-member
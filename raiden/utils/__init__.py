@@ -1,4 +1,5 @@
 import collections
+import functools
 import os
 import random
 import re
@@ -35,6 +36,19 @@ def random_secret():
             return secret
 
 
+# A hash is only reused while its payment is in flight, 128 entries cover
+# more concurrent payments than a node handles
+@functools.lru_cache(maxsize=128)
+def sha3_secret(secret: typing.Secret) -> typing.SecretHash:
+    """ Return the secrethash of `secret`.
+
+    The same secret is hashed by every event and state change of a payment,
+    including when these are restored from the database, so recently used
+    hashes are cached.
+    """
+    return typing.SecretHash(sha3(secret))
+
+
 def ishash(data: bytes) -> bool:
     return isinstance(data, bytes) and len(data) == 32
 
@@ -1,9 +1,13 @@
+import functools
 import os
 import re
 
 from eth_utils import decode_hex
 from solc import compile_files
 
+# '_' is invalid in hex encoding, any occurrence is the start of a symbol
+UNRESOLVED_SYMBOL_RE = re.compile(r'_.{39}')
+
 
 def solidity_resolve_address(hex_code, library_symbol, library_address):
     """ Change the bytecode to use the given library address.
@@ -45,6 +49,7 @@ def solidity_resolve_symbols(hex_code, libraries):
     return hex_code
 
 
+@functools.lru_cache(maxsize=None)
 def solidity_library_symbol(library_name):
     """ Return the symbol used in the bytecode to represent the `library_name`. """
     # the symbol is always 40 characters in length with the minimum of two
@@ -70,7 +75,7 @@ def solidity_unresolved_symbols(hex_code):
     Args:
         hex_code (str): The bytecode encoded as hexadecimal.
     """
-    return set(re.findall(r"_.{39}", hex_code))
+    return set(UNRESOLVED_SYMBOL_RE.findall(hex_code))
 
 
 def compile_files_cwd(*args, **kwargs):